@@ -6,19 +6,33 @@ Receives weather data, detects the country, loads the GeoJSON map,
 and produces a weather visualization image.
 """
 
-import json
-from typing import Optional
+import asyncio
+import hashlib
+import os
+import stat
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+from operator import itemgetter
+from typing import Any, Awaitable, Callable, Dict, List, Optional, Tuple
 from pathlib import Path
 
+import msgspec
+import orjson
 from fastapi import FastAPI, HTTPException, Request
-from fastapi.responses import StreamingResponse, JSONResponse
-from fastapi.staticfiles import StaticFiles
+from fastapi.responses import FileResponse, Response
 from contextlib import asynccontextmanager
 
 # Import the weather map service
-from weather_map_service import WeatherMapService, create_weather_location_from_dict
+from weather_map_service import (
+    MAP_TYPES,
+    WeatherLocation,
+    WeatherMapService,
+    create_weather_location_from_model,
+    create_weather_locations_batch,
+)
 
-# Import Pydantic models
+# Import request models
 from models import MeteoRequest
 
 
@@ -30,6 +44,229 @@ from models import MeteoRequest
 weather_service: Optional[WeatherMapService] = None
 METEO_FOLDER = Path("./meteo")
 
+# Worker processes rendering the maps of /generate/all in parallel
+# (0 renders them in the server's render threads)
+RENDER_PROCESSES = int(os.environ.get("RENDER_PROCESSES", 0))
+
+# Country list is fixed once the service has loaded its maps, so it is
+# computed once at startup instead of on every /countries or /health call
+_countries_cache: Tuple[str, ...] = ()
+_countries_len: int = 0
+
+# Cache-Control for generated maps, which are revalidated with their ETag
+GENERATED_CACHE_CONTROL = "public, max-age=3600"
+
+# Directory listings for /meteo/files: folder path -> (mtime_ns, listing);
+# listings of deleted folders are evicted when their parent is rescanned
+_files_cache: Dict[str, Tuple[int, Any]] = {}
+
+# Maps last written by /generate/all: country -> (body ETag, path -> (inode, mtime_ns))
+_all_maps_written: Dict[str, Tuple[str, Dict[str, Tuple[int, int]]]] = {}
+
+# LRU of /meteo/files entries: (path, inode, mtime_ns) -> file info
+FILE_INFO_CACHE_SIZE = 10_000
+_file_info_cache: "OrderedDict[Tuple[str, int, int], dict]" = OrderedDict()
+
+# JSON schema of the /generate body, generated from the msgspec models since
+# the endpoint reads the raw body; the models go in the OpenAPI components
+(_METEO_REQUEST_SCHEMA,), _MODEL_SCHEMAS = msgspec.json.schema_components(
+    [MeteoRequest], ref_template="#/components/schemas/{name}"
+)
+
+# Renders in progress: (endpoint, body ETag) -> task shared by identical requests
+_inflight: Dict[Tuple[str, str], "asyncio.Future[Any]"] = {}
+
+
+# ===============================
+# HELPER FUNCTIONS
+# ===============================
+
+class _MeteoWrapper(msgspec.Struct):
+    """The {"json": ...} body wrapper, with the wrapped payload left unparsed."""
+    json: msgspec.Raw = msgspec.Raw()
+
+
+def _cached_scan(path: str, scan: Callable[[str], Any]) -> Any:
+    """
+    Return scan(path), reusing the previous result while the directory is unchanged.
+    
+    A directory's mtime changes whenever an entry is added, removed or renamed
+    in it (generated maps are written with a rename), so one stat per folder
+    is enough to tell whether its listing must be rebuilt.
+    """
+    mtime = os.stat(path).st_mtime_ns
+    cached = _files_cache.get(path)
+    if cached is not None and cached[0] == mtime:
+        return cached[1]
+    
+    listing = scan(path)
+    _files_cache[path] = (mtime, listing)
+    
+    # Folders can only disappear from a listing that changed, so this is the
+    # place to drop the cached listings of deleted sub-folders (and their own)
+    prefix = path + os.sep
+    for key in [key for key in _files_cache if key.startswith(prefix)]:
+        if not os.path.isdir(key):
+            del _files_cache[key]
+    return listing
+
+
+def _compute_etag(raw: bytes) -> str:
+    """
+    Compute the ETag of a generation request from its raw body.
+    
+    Maps are saved under the current date, so the date is part of the tag:
+    the same body sent on another day is generated again.
+    """
+    digest = hashlib.blake2b(raw, digest_size=16)
+    digest.update(datetime.now().strftime('%Y-%m-%d').encode())
+    return f'"{digest.hexdigest()}"'
+
+
+def _etag_matches(request: Request, etag: str) -> bool:
+    """Check whether the request's If-None-Match header lists the ETag."""
+    if_none_match = request.headers.get("if-none-match")
+    if not if_none_match:
+        return False
+    return any(tag.strip() in (etag, f"W/{etag}") for tag in if_none_match.split(","))
+
+
+def _file_versions(paths: List[str]) -> Dict[str, Tuple[int, int]]:
+    """Get the (inode, mtime_ns) of files, which changes when a file is rewritten."""
+    versions = {}
+    for path in paths:
+        st = os.stat(path)
+        versions[path] = (st.st_ino, st.st_mtime_ns)
+    return versions
+
+
+def _all_maps_current(country_code: str, etag: str) -> bool:
+    """
+    Check whether the maps on disk are still the ones /generate/all wrote for the ETag.
+    
+    The fixed-name maps are shared by every request for a country and day, so
+    another body, a single-map render or a cleanup may have replaced or removed
+    them since: each file must still be the one that was written.
+    """
+    record = _all_maps_written.get(country_code.lower())
+    if record is None or record[0] != etag:
+        return False
+    try:
+        return _file_versions(list(record[1])) == record[1]
+    except OSError:
+        return False
+
+
+def _parse_meteo_body(raw: bytes) -> Any:
+    """
+    Parse a /generate/raw or /generate/all body into meteo data.
+    
+    Accepts the direct JSON array or the {"json": ...} wrapper, whose value is
+    the array itself or the array serialized as a JSON string. The wrapper is
+    decoded with the payload kept as raw bytes, so the payload is only parsed
+    once, by orjson, instead of being built inside a wrapper dict first.
+    """
+    if raw.lstrip()[:1] != b"{":
+        # Direct array format
+        return orjson.loads(raw)
+    
+    payload = memoryview(msgspec.json.decode(raw, type=_MeteoWrapper).json)
+    if not payload:
+        # Object without a "json" key, rejected by the caller as not a list
+        return None
+    if payload[:1] == b'"':
+        # Parse string JSON
+        return orjson.loads(msgspec.json.decode(payload, type=str))
+    return orjson.loads(payload)
+
+
+async def _single_flight(key: Tuple[str, str], render: Callable[[], Awaitable[Any]]) -> Any:
+    """
+    Await render(), sharing one run between concurrent requests with the same key.
+    
+    The first request starts the render; identical requests arriving while it
+    is in progress wait for that same result instead of rendering again.
+    The task is shielded so a disconnecting client cannot cancel it for the others.
+    """
+    task = _inflight.get(key)
+    if task is None:
+        task = asyncio.ensure_future(render())
+        _inflight[key] = task
+        task.add_done_callback(lambda _: _inflight.pop(key, None))
+    return await asyncio.shield(task)
+
+
+async def _render_all_maps(weather_locations: List[WeatherLocation], country_code: str) -> Dict[str, str]:
+    """Render every map type for /generate/all, returning map_type -> output path."""
+    # Load the map and order locations once, then render the map types
+    # concurrently from that shared, read-only data: in worker processes
+    # when configured, otherwise in the render threads
+    prepared = await asyncio.to_thread(
+        weather_service.prepare_map,
+        meteo_data=weather_locations,
+        country_code=country_code
+    )
+    if weather_service.render_processes:
+        output_paths = await asyncio.gather(*(
+            asyncio.wrap_future(weather_service.submit_render(prepared, map_type))
+            for map_type in MAP_TYPES
+        ))
+    else:
+        results = await asyncio.gather(*(
+            asyncio.to_thread(
+                weather_service.render_map, prepared, map_type=map_type, return_buffer=False
+            )
+            for map_type in MAP_TYPES
+        ))
+        output_paths = [output_path for _, output_path in results]
+    
+    return {
+        map_type: output_path
+        for map_type, output_path in zip(MAP_TYPES, output_paths)
+        if output_path
+    }
+
+
+def _scan_subdirs(path: str) -> List[Tuple[str, str]]:
+    """List (name, path) of the sub-directories of a folder."""
+    # DirEntry.is_dir() reuses the file type returned by readdir,
+    # avoiding the extra stat of Path.is_dir()
+    with os.scandir(path) as entries:
+        return [
+            (entry.name, entry.path)
+            for entry in entries
+            if entry.is_dir(follow_symlinks=False)
+        ]
+
+
+def _scan_png_files(path: str, url_prefix: str) -> List[dict]:
+    """List the PNG files of a date folder, sorted by name."""
+    files = []
+    with os.scandir(path) as entries:
+        for entry in entries:
+            if not entry.name.endswith(".png"):
+                continue
+            
+            # Unchanged files (same inode and mtime) reuse their entry
+            st = entry.stat()
+            key = (entry.path, st.st_ino, st.st_mtime_ns)
+            file_info = _file_info_cache.get(key)
+            if file_info is None:
+                file_info = {
+                    "name": entry.name,
+                    "url": f"{url_prefix}/{entry.name}",
+                    "size_kb": round(st.st_size / 1024, 2)
+                }
+                _file_info_cache[key] = file_info
+                if len(_file_info_cache) > FILE_INFO_CACHE_SIZE:
+                    _file_info_cache.popitem(last=False)
+            else:
+                _file_info_cache.move_to_end(key)
+            files.append(file_info)
+    
+    files.sort(key=itemgetter("name"))
+    return files
+
 
 # ===============================
 # LIFESPAN EVENT HANDLER
@@ -38,15 +275,24 @@ METEO_FOLDER = Path("./meteo")
 @asynccontextmanager
 async def lifespan(app: FastAPI):
     """Initialize and cleanup the weather map service."""
-    global weather_service
+    global weather_service, _countries_cache, _countries_len
     
     # Initialize the weather map service
-    weather_service = WeatherMapService()
+    weather_service = WeatherMapService(render_processes=RENDER_PROCESSES)
+    _countries_cache = weather_service.get_available_countries()
+    _countries_len = len(_countries_cache)
+    
+    # Map rendering runs in the loop's default executor (asyncio.to_thread);
+    # bound it to the CPU count so concurrent requests cannot spawn a thread each
+    asyncio.get_running_loop().set_default_executor(
+        ThreadPoolExecutor(max_workers=os.cpu_count() or 1, thread_name_prefix="render")
+    )
     
     yield  # Server runs here
     
-    # Cleanup on shutdown (if needed)
+    # Cleanup on shutdown
     print("🛑 Server shutting down...")
+    weather_service.close()
 
 
 # ===============================
@@ -63,8 +309,16 @@ app = FastAPI(
 # Ensure meteo folder exists
 METEO_FOLDER.mkdir(parents=True, exist_ok=True)
 
-# Mount the meteo folder as static files for HTTP browsing
-app.mount("/meteo", StaticFiles(directory=str(METEO_FOLDER), html=True), name="meteo")
+
+def _openapi() -> Dict[str, Any]:
+    """Build the OpenAPI schema, adding the msgspec request models to its components."""
+    if app.openapi_schema is None:
+        schema = FastAPI.openapi(app)
+        schema.setdefault("components", {}).setdefault("schemas", {}).update(_MODEL_SCHEMAS)
+    return app.openapi_schema
+
+
+app.openapi = _openapi
 
 
 # ===============================
@@ -96,7 +350,7 @@ async def health_check():
     """Health check endpoint."""
     return {
         "status": "healthy",
-        "maps_loaded": len(weather_service.get_available_countries()) if weather_service else 0
+        "maps_loaded": _countries_len if weather_service else 0
     }
 
 
@@ -107,8 +361,8 @@ async def list_countries():
         raise HTTPException(status_code=500, detail="Service not initialized")
     
     return {
-        "available_countries": weather_service.get_available_countries(),
-        "count": len(weather_service.get_available_countries())
+        "available_countries": _countries_cache,
+        "count": _countries_len
     }
 
 
@@ -126,28 +380,17 @@ async def list_generated_files():
     total_files = 0
     
     # Iterate through country folders
-    for country_folder in METEO_FOLDER.iterdir():
-        if country_folder.is_dir():
-            country_code = country_folder.name
-            result[country_code] = {}
+    for country_code, country_path in _cached_scan(str(METEO_FOLDER), _scan_subdirs):
+        result[country_code] = {}
+        
+        # Iterate through date folders
+        for date, date_path in _cached_scan(country_path, _scan_subdirs):
+            url_prefix = f"/meteo/{country_code}/{date}"
+            files = _cached_scan(date_path, lambda path: _scan_png_files(path, url_prefix))
             
-            # Iterate through date folders
-            for date_folder in country_folder.iterdir():
-                if date_folder.is_dir():
-                    date = date_folder.name
-                    files = []
-                    
-                    # List all PNG files in this date folder
-                    for file in sorted(date_folder.glob("*.png")):
-                        files.append({
-                            "name": file.name,
-                            "url": f"/meteo/{country_code}/{date}/{file.name}",
-                            "size_kb": round(file.stat().st_size / 1024, 2)
-                        })
-                        total_files += 1
-                    
-                    if files:
-                        result[country_code][date] = files
+            if files:
+                result[country_code][date] = files
+                total_files += len(files)
     
     return {
         "countries": result,
@@ -155,8 +398,62 @@ async def list_generated_files():
     }
 
 
-@app.post("/generate")
-async def generate_map(request: MeteoRequest):
+@app.get("/meteo/{country}/{date}/{filename}")
+# HEAD shares the handler but stays out of the schema, where it would
+# duplicate the GET operation id
+@app.head("/meteo/{country}/{date}/{filename}", include_in_schema=False)
+async def get_generated_file(country: str, date: str, filename: str, request: Request):
+    """
+    Download a generated weather map.
+    
+    Timestamped maps never change once written and are served as immutable;
+    fixed-name maps (maxtemp.png, ...) are rewritten on every /generate/all
+    and are revalidated with their ETag instead.
+    """
+    # Path parameters cannot contain "/", so rejecting dot-prefixed parts
+    # rules out ".." as well as in-progress ".<name>.tmp" files
+    if not filename.endswith(".png") or any(
+        part.startswith(".") for part in (country, date, filename)
+    ):
+        raise HTTPException(status_code=404, detail="Not Found")
+    
+    path = METEO_FOLDER / country / date / filename
+    try:
+        stat_result = os.stat(path)
+    except OSError:
+        raise HTTPException(status_code=404, detail="Not Found")
+    if not stat.S_ISREG(stat_result.st_mode):
+        raise HTTPException(status_code=404, detail="Not Found")
+    
+    if filename[:-len(".png")] in MAP_TYPES:
+        cache_control = "no-cache"
+    else:
+        cache_control = "public, max-age=86400, immutable"
+    
+    # Pass the stat result along so FileResponse does not stat the file again
+    response = FileResponse(
+        path,
+        media_type="image/png",
+        stat_result=stat_result,
+        headers={"Cache-Control": cache_control}
+    )
+    
+    etag = response.headers["etag"]
+    if _etag_matches(request, etag):
+        return Response(status_code=304, headers={"ETag": etag, "Cache-Control": cache_control})
+    return response
+
+
+@app.post(
+    "/generate",
+    openapi_extra={
+        "requestBody": {
+            "content": {"application/json": {"schema": _METEO_REQUEST_SCHEMA}},
+            "required": True
+        }
+    }
+)
+async def generate_map(request: Request):
     """
     Generate a weather map image from meteo data.
     
@@ -178,11 +475,19 @@ async def generate_map(request: MeteoRequest):
     if not weather_service:
         raise HTTPException(status_code=500, detail="Service not initialized")
     
-    if not request.meteo_data:
+    # Decode and validate the body in one pass with msgspec; lax mode keeps
+    # the coercions Pydantic accepted (e.g. 100.0 or "100" for an int field)
+    raw = await request.body()
+    try:
+        meteo_request = msgspec.json.decode(raw, type=MeteoRequest, strict=False)
+    except msgspec.DecodeError as e:
+        raise HTTPException(status_code=422, detail=f"Invalid request body: {str(e)}")
+    
+    if not meteo_request.meteo_data:
         raise HTTPException(status_code=400, detail="No meteo data provided")
     
     # Detect country from first location's capital field
-    country_code = request.meteo_data[0].capital
+    country_code = meteo_request.meteo_data[0].capital
     
     if not country_code:
         raise HTTPException(
@@ -190,29 +495,37 @@ async def generate_map(request: MeteoRequest):
             detail="Country code (capital field) is required in meteo data"
         )
     
-    if country_code.lower() not in weather_service.get_available_countries():
+    if not weather_service.has_country(country_code):
         raise HTTPException(
             status_code=404,
-            detail=f"Map not found for country: {country_code}. Available: {weather_service.get_available_countries()}"
+            detail=f"Map not found for country: {country_code}. Available: {list(_countries_cache)}"
         )
     
     try:
-        # Convert Pydantic models to service dataclasses
+        # Convert request models to service dataclasses
         weather_locations = [
-            create_weather_location_from_dict(loc.model_dump())
-            for loc in request.meteo_data
+            create_weather_location_from_model(loc)
+            for loc in meteo_request.meteo_data
         ]
         
-        # Generate the map image using the service
-        image_buffer, saved_path = weather_service.generate_map(
-            meteo_data=weather_locations,
-            country_code=country_code,
-            title=request.title,
-            day_index=request.day_index or 0
+        # Generate the map image in a worker thread (rendering is CPU-bound
+        # and would otherwise block the event loop), sharing the render with
+        # identical concurrent requests
+        image_buffer, saved_path = await _single_flight(
+            ("generate", _compute_etag(raw)),
+            lambda: asyncio.to_thread(
+                weather_service.generate_map,
+                meteo_data=weather_locations,
+                country_code=country_code,
+                title=meteo_request.title,
+                day_index=meteo_request.day_index or 0
+            )
         )
         
-        return StreamingResponse(
-            image_buffer,
+        # The PNG is already fully rendered in memory, so send it in one go
+        # rather than iterating the buffer through a StreamingResponse
+        return Response(
+            content=image_buffer.getvalue(),
             media_type="image/png",
             headers={
                 "Content-Disposition": f"inline; filename=weather_map_{country_code}.png",
@@ -237,18 +550,16 @@ async def generate_map_raw(request: Request):
     
     try:
         # Get raw body
-        body = await request.json()
+        raw = await request.body()
         
-        # Handle wrapped format {"json": "[...]"}
-        if isinstance(body, dict) and "json" in body:
-            if isinstance(body["json"], str):
-                # Parse string JSON
-                meteo_data = json.loads(body["json"])
-            else:
-                meteo_data = body["json"]
-        else:
-            # Direct array format
-            meteo_data = body
+        # Same body renders the same map: a client that already has it can
+        # send its ETag in If-None-Match, which fails the POST with a 412
+        etag = _compute_etag(raw)
+        if _etag_matches(request, etag):
+            return Response(status_code=412, headers={"ETag": etag})
+        
+        # Parse direct array or wrapped format {"json": "[...]"}
+        meteo_data = _parse_meteo_body(raw)
         
         # Validate it's a list
         if not isinstance(meteo_data, list):
@@ -263,30 +574,37 @@ async def generate_map_raw(request: Request):
         
         country_code = meteo_data[0]["capital"]
         
-        if country_code.lower() not in weather_service.get_available_countries():
+        if not weather_service.has_country(country_code):
             raise HTTPException(
                 status_code=404,
                 detail=f"Map not found for country: {country_code}"
             )
         
         # Convert to service dataclasses
-        weather_locations = [create_weather_location_from_dict(item) for item in meteo_data]
+        weather_locations = create_weather_locations_batch(meteo_data)
         
-        # Generate map using service
-        image_buffer, saved_path = weather_service.generate_map(
-            meteo_data=weather_locations,
-            country_code=country_code
+        # Generate map using service in a worker thread, sharing the
+        # render with identical concurrent requests
+        image_buffer, saved_path = await _single_flight(
+            ("raw", etag),
+            lambda: asyncio.to_thread(
+                weather_service.generate_map,
+                meteo_data=weather_locations,
+                country_code=country_code
+            )
         )
         
-        return StreamingResponse(
-            image_buffer,
+        return Response(
+            content=image_buffer.getvalue(),
             media_type="image/png",
             headers={
-                "X-Saved-Path": saved_path if saved_path else ""
+                "X-Saved-Path": saved_path if saved_path else "",
+                "ETag": etag,
+                "Cache-Control": GENERATED_CACHE_CONTROL
             }
         )
     
-    except json.JSONDecodeError as e:
+    except (orjson.JSONDecodeError, msgspec.DecodeError) as e:
         raise HTTPException(status_code=400, detail=f"Invalid JSON: {str(e)}")
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Error generating map: {str(e)}")
@@ -309,18 +627,12 @@ async def generate_all_maps(request: Request):
     
     try:
         # Get raw body
-        body = await request.json()
+        raw = await request.body()
         
-        # Handle wrapped format {"json": "[...]"}
-        if isinstance(body, dict) and "json" in body:
-            if isinstance(body["json"], str):
-                # Parse string JSON
-                meteo_data = json.loads(body["json"])
-            else:
-                meteo_data = body["json"]
-        else:
-            # Direct array format
-            meteo_data = body
+        etag = _compute_etag(raw)
+        
+        # Parse direct array or wrapped format {"json": "[...]"}
+        meteo_data = _parse_meteo_body(raw)
         
         # Validate it's a list
         if not isinstance(meteo_data, list):
@@ -335,29 +647,42 @@ async def generate_all_maps(request: Request):
         
         country_code = meteo_data[0]["capital"]
         
-        if country_code.lower() not in weather_service.get_available_countries():
+        if not weather_service.has_country(country_code):
             raise HTTPException(
                 status_code=404,
                 detail=f"Map not found for country: {country_code}"
             )
         
+        # Same body renders the same maps: a client that already has them can
+        # send its ETag in If-None-Match, which fails the POST with a 412 as
+        # long as the maps on disk are still the ones written for that body
+        if _etag_matches(request, etag) and _all_maps_current(country_code, etag):
+            return Response(status_code=412, headers={"ETag": etag})
+        
         # Convert to service dataclasses
-        weather_locations = [create_weather_location_from_dict(item) for item in meteo_data]
+        weather_locations = create_weather_locations_batch(meteo_data)
         
-        # Generate all maps using service
-        generated_files = weather_service.generate_all_maps(
-            meteo_data=weather_locations,
-            country_code=country_code
+        # Generate all maps, sharing the work with identical concurrent requests
+        generated_files = await _single_flight(
+            ("all", etag),
+            lambda: _render_all_maps(weather_locations, country_code)
+        )
+        _all_maps_written[country_code.lower()] = (
+            etag, _file_versions(list(generated_files.values()))
         )
         
-        return JSONResponse({
-            "status": "success",
-            "country": country_code,
-            "generated_files": generated_files,
-            "count": len(generated_files)
-        })
-    
-    except json.JSONDecodeError as e:
+        return Response(
+            orjson.dumps({
+                "status": "success",
+                "country": country_code,
+                "generated_files": generated_files,
+                "count": len(generated_files)
+            }),
+            media_type="application/json",
+            headers={"ETag": etag, "Cache-Control": GENERATED_CACHE_CONTROL}
+        )
+    
+    except (orjson.JSONDecodeError, msgspec.DecodeError) as e:
         raise HTTPException(status_code=400, detail=f"Invalid JSON: {str(e)}")
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Error generating maps: {str(e)}")
@@ -369,6 +694,5 @@ async def generate_all_maps(request: Request):
 
 if __name__ == "__main__":
     import uvicorn
-    import os
     port = int(os.environ.get("PORT", 8000))
     uvicorn.run(app, host="0.0.0.0", port=port)
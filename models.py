@@ -1,14 +1,17 @@
 """
-Pydantic Models for Weather Map API
+Request Models for Weather Map API
 
 Data models for validating and parsing weather data from API requests.
+Defined as msgspec Structs: decoding and validation of a request body
+happen in a single pass, much faster than Pydantic on large meteo arrays.
 """
 
-from typing import List, Optional
-from pydantic import BaseModel, Field
+from typing import Annotated, List, Optional
 
+import msgspec
 
-class DailyUnits(BaseModel):
+
+class DailyUnits(msgspec.Struct, kw_only=True):
     """Units for daily weather measurements."""
     time: str = "iso8601"
     weather_code: str = "wmo code"
@@ -20,7 +23,7 @@ class DailyUnits(BaseModel):
     cloud_cover_max: Optional[str] = "%"
 
 
-class DailyData(BaseModel):
+class DailyData(msgspec.Struct, kw_only=True):
     """Daily weather data arrays."""
     time: List[str]
     weather_code: List[int]
@@ -32,7 +35,7 @@ class DailyData(BaseModel):
     cloud_cover_max: Optional[List[int]] = None
 
 
-class MeteoLocation(BaseModel):
+class MeteoLocation(msgspec.Struct, kw_only=True):
     """Weather data for a specific location."""
     latitude: float
     longitude: float
@@ -44,13 +47,13 @@ class MeteoLocation(BaseModel):
     daily_units: Optional[DailyUnits] = None
     daily: DailyData
     id: str
-    capital: str = Field(..., description="Country code (e.g., 'dz' for Algeria)")
+    capital: Annotated[str, msgspec.Meta(description="Country code (e.g., 'dz' for Algeria)")]
     name: str
     display_name: Optional[str] = None
     priority: Optional[int] = 1
 
 
-class MeteoRequest(BaseModel):
+class MeteoRequest(msgspec.Struct, kw_only=True):
     """Request body for generating a weather map."""
     meteo_data: List[MeteoLocation]
     title: Optional[str] = None
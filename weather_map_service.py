@@ -6,15 +6,25 @@ Can be used independently from the REST API or integrated into other application
 """
 
 import io
+import multiprocessing
+import os
+import threading
+import uuid
+from concurrent.futures import Future, ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
 from pathlib import Path
-from typing import List, Optional, Dict, Tuple
+from typing import TYPE_CHECKING, List, Optional, Dict, Tuple
 from datetime import datetime
-from dataclasses import dataclass
+from dataclasses import dataclass, fields
+from operator import itemgetter
 
-import geopandas as gpd
-import matplotlib.pyplot as plt
-import matplotlib
-matplotlib.use('Agg')  # Non-interactive backend for server use
+import numpy as np
+
+# geopandas and matplotlib are slow to import and only needed to render,
+# so they are imported on first use (see WeatherMapService._ensure_libs)
+if TYPE_CHECKING:
+    import geopandas as gpd
+    from models import MeteoLocation
 
 
 # ===============================
@@ -55,6 +65,73 @@ WEATHER_ICONS = {
     99: "⛈🧊",   # Thunderstorm with heavy hail
 }
 
+# WMO codes are small ints (< 100): a tuple indexed by code avoids hashing
+# on the per-location icon lookup
+_MAX_WMO = 100
+WEATHER_ICONS_ARR = tuple(WEATHER_ICONS.get(code, "❓") for code in range(_MAX_WMO))
+
+# Same table as an array for looking up a whole column of codes at once;
+# the extra last entry is the icon of out-of-range codes
+_WEATHER_ICONS_LUT = np.array(WEATHER_ICONS_ARR + ("❓",), dtype=object)
+
+
+# Map types produced by generate_all_maps(), each saved as <map_type>.png
+MAP_TYPES = ("maxtemp", "mintemp", "wind", "sun")
+
+# Marker colors by map type: (day frame column, comparison, thresholds,
+# colors). A location's color ID is the number of thresholds its value
+# passes (NaN passes none), and indexes the colors
+_MARKER_COLOR_RULES = {
+    "maxtemp": ("tmax", np.greater, (15, 25), ("#2196f3", "#ff9800", "#ff5722")),
+    "mintemp": ("tmin", np.less, (15, 5), ("#ff9800", "#03a9f4", "#2196f3")),
+    "wind": ("wind", np.greater, (20, 30), ("#4caf50", "#ff9800", "#d32f2f")),
+    "sun": ("sunshine", np.greater, (40, 70), ("#90a4ae", "#ffb300", "#fdd835")),
+}
+_DEFAULT_MARKER_COLOR = "#d32f2f"
+
+
+def _hex_to_rgba(colors: Tuple[str, ...]) -> np.ndarray:
+    """Convert '#rrggbb' colors to an RGBA float array, as matplotlib does."""
+    return np.array([
+        [int(color[i:i + 2], 16) / 255 for i in (1, 3, 5)] + [1.0]
+        for color in colors
+    ])
+
+
+# Color lookup tables as RGBA rows, so scatter gets ready colors instead of
+# parsing one hex string per marker
+_MARKER_COLOR_LUTS = {
+    map_type: _hex_to_rgba(colors)
+    for map_type, (_, _, _, colors) in _MARKER_COLOR_RULES.items()
+}
+_DEFAULT_MARKER_RGBA = _hex_to_rgba((_DEFAULT_MARKER_COLOR,))
+
+# Box drawn behind each location label
+LABEL_BBOX = {
+    "boxstyle": "round,pad=0.3",
+    "fc": "white",
+    "ec": "#666666",
+    "alpha": 0.92,
+    "linewidth": 1
+}
+
+# Output size and resolution of the rendered maps, and the fixed margins
+# around the map (room left at the top for the title)
+MAP_FIGSIZE = (12, 11)
+MAP_DPI = 200
+MAP_MARGINS = {"left": 0.02, "right": 0.98, "bottom": 0.02, "top": 0.93}
+
+# Padding kept around the map contents when cropping the image (the
+# bbox_inches='tight' default of 0.1 inch)
+MAP_CROP_PAD = 0.1 * MAP_DPI
+
+# Area of the city markers, in points^2 (scatter's s)
+MAP_MARKER_SIZE = 36
+
+# Pillow PNG encoder options: fast zlib level, the default level costs
+# several times more CPU for slightly smaller files
+PNG_SAVE_OPTIONS = {"compress_level": 1, "optimize": False}
+
 
 # ===============================
 # DATA MODELS
@@ -62,15 +139,34 @@ WEATHER_ICONS = {
 
 @dataclass
 class DailyData:
-    """Daily weather data for a location."""
+    """
+    Daily weather data for a location.
+    
+    Numeric series may be given as lists and are stored as float64 arrays
+    (NaN where a value is null), so they are stacked into a WeatherBatch
+    without converting every value again. float64 holds JSON numbers without
+    rounding; labels print integral values as ints (see _format_values).
+    """
     time: List[str]
-    weather_code: List[int]
-    temperature_2m_max: List[float]
-    temperature_2m_min: List[float]
-    precipitation_sum: List[float]
-    wind_speed_10m_max: List[float]
-    cloud_cover_min: Optional[List[int]] = None
-    cloud_cover_max: Optional[List[int]] = None
+    weather_code: np.ndarray
+    temperature_2m_max: np.ndarray
+    temperature_2m_min: np.ndarray
+    precipitation_sum: np.ndarray
+    wind_speed_10m_max: np.ndarray
+    cloud_cover_min: Optional[np.ndarray] = None
+    cloud_cover_max: Optional[np.ndarray] = None
+    
+    def __post_init__(self):
+        for name in _DAILY_SERIES:
+            values = getattr(self, name)
+            if values is not None:
+                setattr(self, name, np.asarray(values, dtype=np.float64))
+
+
+# DailyData fields, resolved once for create_weather_location_from_model(),
+# and the numeric ones stored as arrays
+_DAILY_FIELDS = fields(DailyData)
+_DAILY_SERIES = tuple(f.name for f in _DAILY_FIELDS if f.name != "time")
 
 
 @dataclass
@@ -84,6 +180,193 @@ class WeatherLocation:
     priority: int = 1
 
 
+@dataclass(frozen=True)
+class WeatherBatch:
+    """
+    Struct-of-arrays view of a list of locations, one row per location.
+    
+    Daily values are (locations, days) arrays, so one day's values for every
+    location is a single column instead of an attribute walk per location.
+    """
+    lat: np.ndarray
+    lon: np.ndarray
+    names: Tuple[str, ...]
+    priority: np.ndarray
+    tmax: np.ndarray
+    tmin: np.ndarray
+    rain: np.ndarray
+    wind: np.ndarray
+    weather_code: np.ndarray
+    cloud_max: np.ndarray  # NaN where cloud cover is missing
+    label_x: np.ndarray  # Label anchor, offset from the marker by priority
+    label_y: np.ndarray
+    label_fontsize: np.ndarray
+    
+    def __post_init__(self):
+        # A batch is built once per request and handed by reference to every
+        # render thread (no per-render copy or pickling), so freeze the arrays
+        # to make that sharing safe
+        for value in vars(self).values():
+            if isinstance(value, np.ndarray):
+                value.setflags(write=False)
+    
+    @classmethod
+    def from_locations(cls, locations: List[WeatherLocation]) -> "WeatherBatch":
+        """Build the arrays from WeatherLocation objects, one allocation per column."""
+        n = len(locations)
+        dailies = [loc.daily for loc in locations]
+        lat = np.fromiter((loc.latitude for loc in locations), dtype=np.float64, count=n)
+        lon = np.fromiter((loc.longitude for loc in locations), dtype=np.float64, count=n)
+        priority = np.fromiter((loc.priority or 1 for loc in locations), dtype=np.int64, count=n)
+        
+        # Label position and size by priority: closer and larger for the
+        # most important locations
+        offset = np.where(priority <= 2, 0.2, 0.15)
+        
+        tmax = _stack_daily([d.temperature_2m_max for d in dailies])
+        
+        return cls(
+            lat=lat,
+            lon=lon,
+            names=tuple(loc.display_name or loc.name for loc in locations),
+            priority=priority,
+            tmax=tmax,
+            tmin=_stack_daily([d.temperature_2m_min for d in dailies]),
+            rain=_stack_daily([d.precipitation_sum for d in dailies]),
+            wind=_stack_daily([d.wind_speed_10m_max for d in dailies]),
+            weather_code=_stack_daily([d.weather_code for d in dailies]).astype(np.int64),
+            # At least as many days as tmax, whose width bounds day_column()
+            cloud_max=_stack_daily(
+                [d.cloud_cover_max for d in dailies], pad_last=False, min_width=tmax.shape[1]
+            ),
+            label_x=lon + offset,
+            label_y=lat + offset,
+            label_fontsize=np.select([priority == 1, priority == 2], [10, 9], default=8)
+        )
+    
+    def take(self, order: np.ndarray) -> "WeatherBatch":
+        """Return a batch with the rows reordered (or selected) by an index array."""
+        return WeatherBatch(**{
+            name: value[order] if isinstance(value, np.ndarray) else tuple(value[i] for i in order.tolist())
+            for name, value in vars(self).items()
+        })
+    
+    def day_column(self, day_index: int) -> int:
+        """Column holding day_index, clamped to the last available day."""
+        return min(day_index, self.tmax.shape[1] - 1)
+
+
+@dataclass(frozen=True)
+class PreparedMap:
+    """Country map and ordered locations shared by the renders of one request."""
+    country_code: str
+    country: "gpd.GeoDataFrame"
+    batch: WeatherBatch  # Rows sorted by priority, drawn in order
+    dates: Tuple[str, ...]
+
+
+def _stack_daily(
+    rows: List[Optional[np.ndarray]],
+    pad_last: bool = True,
+    min_width: int = 1
+) -> np.ndarray:
+    """
+    Stack per-location daily series into a (locations, days) float array.
+    
+    Shorter rows are padded with their last value when pad_last is set (so a
+    column matches the old per-location min(day_index, len - 1) lookup),
+    otherwise with NaN. Missing rows are all NaN. The array has at least
+    min_width columns.
+    """
+    lengths = [0 if row is None else len(row) for row in rows]
+    width = max(lengths, default=0)
+    if width >= min_width and min(lengths) == width:
+        return np.array(rows, dtype=np.float64)
+    
+    stacked = np.full((len(rows), max(width, min_width)), np.nan)
+    for i, (row, length) in enumerate(zip(rows, lengths)):
+        if length:
+            stacked[i, :length] = row
+            if pad_last:
+                stacked[i, length:] = row[-1]
+    return stacked
+
+
+def _format_values(values: np.ndarray) -> List[str]:
+    """
+    Format a column of daily values for the map labels.
+    
+    Values are stored as floats, but the JSON payloads carry whole numbers
+    as ints (e.g. 7, not 7.0); integral values are printed without the
+    trailing .0 as those ints were.
+    """
+    return [
+        str(int(value)) if value.is_integer() else str(value)
+        for value in values.tolist()
+    ]
+
+
+def _build_day_frame(batch: WeatherBatch, day_index: int) -> Dict[str, np.ndarray]:
+    """
+    Gather one day's values for every location of a batch.
+    
+    Each entry is a contiguous 1-D array with one value per batch row, taken
+    from the daily arrays in a single column gather.
+    
+    Args:
+        batch: Locations to read from
+        day_index: Which day's data to gather (clamped to the last day)
+    
+    Returns:
+        Dictionary with tmax, tmin, rain, wind, wcode, icon, cloud and
+        sunshine arrays (cloud and sunshine are NaN where cloud cover is missing)
+    """
+    col = batch.day_column(day_index)
+    wcode = batch.weather_code.take(col, axis=1)
+    cloud = batch.cloud_max.take(col, axis=1)
+    return {
+        "tmax": batch.tmax.take(col, axis=1),
+        "tmin": batch.tmin.take(col, axis=1),
+        "rain": batch.rain.take(col, axis=1),
+        "wind": batch.wind.take(col, axis=1),
+        "wcode": wcode,
+        "icon": _WEATHER_ICONS_LUT[np.where((wcode >= 0) & (wcode < _MAX_WMO), wcode, _MAX_WMO)],
+        "cloud": cloud,
+        "sunshine": 100 - cloud
+    }
+
+
+def _simplify_for_map(country: "gpd.GeoDataFrame") -> "gpd.GeoDataFrame":
+    """
+    Drop the vertices of a country map that the rendered image cannot show.
+    
+    Geometries are simplified to half an output pixel at the scale the map is
+    drawn at, which removes most coastline and border vertices (and their
+    drawing cost) without a visible change. Regions are kept separate so
+    their borders are still drawn.
+    
+    Args:
+        country: Country map in EPSG:4326
+    
+    Returns:
+        Simplified copy of the country map
+    """
+    minx, miny, maxx, maxy = country.total_bounds
+    
+    # Drawing area in pixels, and the latitude stretch geopandas applies to
+    # geographic coordinates (1 / cos of the middle latitude)
+    width = MAP_FIGSIZE[0] * MAP_DPI * (MAP_MARGINS["right"] - MAP_MARGINS["left"])
+    height = MAP_FIGSIZE[1] * MAP_DPI * (MAP_MARGINS["top"] - MAP_MARGINS["bottom"])
+    aspect = 1 / np.cos(np.radians((miny + maxy) / 2))
+    
+    # Pixels per degree of latitude (the larger scale) when the map fits the area
+    scale = min(width / max(maxx - minx, 1e-9), height / max((maxy - miny) * aspect, 1e-9)) * aspect
+    
+    simplified = country.copy()
+    simplified.geometry = country.geometry.simplify(0.5 / scale, preserve_topology=True)
+    return simplified
+
+
 # ===============================
 # WEATHER MAP SERVICE
 # ===============================
@@ -94,7 +377,8 @@ class WeatherMapService:
     def __init__(
         self,
         maps_folder: Path = Path("./maps"),
-        output_folder: Path = Path("./meteo")
+        output_folder: Path = Path("./meteo"),
+        render_processes: int = 0
     ):
         """
         Initialize the Weather Map Service.
@@ -102,13 +386,34 @@ class WeatherMapService:
         Args:
             maps_folder: Path to folder containing GeoJSON map files
             output_folder: Path to folder where generated maps will be saved
+            render_processes: Worker processes that render the maps saved by
+                generate_all_maps() (0 renders them in the calling thread)
         """
         self.maps_folder = Path(maps_folder)
         self.output_folder = Path(output_folder)
+        self.render_processes = render_processes
         self.supported_countries: Dict[str, str] = {}
         
+        # Plotting libraries, imported lazily by _ensure_libs()
+        self._gpd = None
+        self._Figure = None
+        self._FigureCanvasAgg = None
+        self._Image = None
+        
+        # Reprojected country maps, parsed once per country on first use
+        self._geo_cache: Dict[str, "gpd.GeoDataFrame"] = {}
+        self._geo_lock = threading.Lock()
+        
+        # Per-thread figure reused across renders (see _get_figure)
+        self._local = threading.local()
+        
+        # Render worker processes, started on first use (see submit_render)
+        self._pool: Optional[ProcessPoolExecutor] = None
+        self._pool_lock = threading.Lock()
+        
         # Load available maps
         self._load_available_maps()
+        self._countries: Tuple[str, ...] = tuple(self.supported_countries)
     
     def _load_available_maps(self):
         """Load all available country maps from the maps folder."""
@@ -117,21 +422,226 @@ class WeatherMapService:
             print(f"⚠️ Created maps folder at {self.maps_folder}")
             return
         
-        for map_file in self.maps_folder.glob("*.json"):
-            country_code = map_file.stem.lower()
-            self.supported_countries[country_code] = str(map_file)
+        # One directory read; DirEntry carries the name and file type, so no
+        # Path object or extra stat per file
+        with os.scandir(self.maps_folder) as entries:
+            for entry in entries:
+                if entry.name.endswith(".json") and entry.is_file():
+                    self.supported_countries[entry.name[:-5].lower()] = entry.path
         
         if self.supported_countries:
             print(f"📍 Loaded {len(self.supported_countries)} country maps: {list(self.supported_countries.keys())}")
     
-    def get_available_countries(self) -> List[str]:
-        """Get list of available country codes."""
-        return list(self.supported_countries.keys())
+    def _ensure_libs(self):
+        """Import geopandas and matplotlib the first time a map is rendered."""
+        if self._gpd is None:
+            import matplotlib
+            matplotlib.use('Agg')  # Non-interactive backend for server use
+            from matplotlib.figure import Figure
+            from matplotlib.backends.backend_agg import FigureCanvasAgg
+            from PIL import Image
+            import geopandas as gpd
+            
+            # Set geopandas last: it is the flag checked above
+            self._Figure = Figure
+            self._FigureCanvasAgg = FigureCanvasAgg
+            self._Image = Image
+            self._gpd = gpd
+    
+    def get_available_countries(self) -> Tuple[str, ...]:
+        """Get available country codes (built once at init, not per call)."""
+        return self._countries
+    
+    def has_country(self, country_code: str) -> bool:
+        """Check whether a map is available for a country code (case-insensitive)."""
+        return country_code.lower() in self.supported_countries
+    
+    def _get_figure(self, prepared: PreparedMap):
+        """
+        Get this thread's figure and axes, ready to plot the locations on.
+        
+        Building a Figure is a fixed cost per render, so each worker thread
+        keeps one; the number of live figures is bounded by the number of
+        threads rendering maps. The country base map is the expensive part to
+        draw, so it is kept between renders of the same country; only the
+        markers of the previous render are removed, and its labels are hidden
+        to be reused by the next one.
+        """
+        local = self._local
+        if getattr(local, "fig", None) is None:
+            self._ensure_libs()
+            # Object API rather than pyplot, whose global figure state is not
+            # safe when maps are rendered from worker threads
+            local.fig = self._Figure(
+                figsize=MAP_FIGSIZE, dpi=MAP_DPI, facecolor='white', edgecolor='none'
+            )
+            self._FigureCanvasAgg(local.fig)  # Drawn directly, see _rasterize
+            local.ax = local.fig.subplots()
+            # Fixed margins (room left for the title) instead of measuring a
+            # tight bbox on every savefig, which costs an extra layout pass
+            local.fig.subplots_adjust(**MAP_MARGINS)
+            local.base = None
+            local.overlays = []
+            local.markers = None
+            local.labels = []
+            local.background = None
+            local.png_buffer = io.BytesIO()
+        
+        ax = local.ax
+        if local.base is prepared.country:
+            if local.markers is not None:
+                local.markers.remove()
+            for label in local.labels:
+                label.set_visible(False)
+            # Forget the removed markers' extent so autoscaling matches a fresh plot;
+            # Bbox.set would share the points array, letting the next scatter
+            # write its extent into the cached base limits
+            ax.dataLim.set_points(local.base_datalim.get_points().copy())
+            ax.autoscale_view()
+        else:
+            ax.clear()
+            
+            # Plot base map
+            prepared.country.plot(
+                ax=ax,
+                color="#e8f4e8",  # Light green background
+                edgecolor="#333333",
+                linewidth=0.8
+            )
+            ax.axis("off")
+            
+            # Remove borders
+            for spine in ax.spines.values():
+                spine.set_visible(False)
+            
+            local.base = prepared.country
+            local.base_datalim = ax.dataLim.frozen()
+            local.background = None
+            local.labels = []  # Removed by ax.clear()
+        
+        local.overlays = []
+        local.markers = None
+        return local.fig, ax
+    
+    def _rasterize(self, fig, ax) -> np.ndarray:
+        """
+        Draw the figure and return its RGBA pixels.
+        
+        Drawing the country polygon is most of the drawing cost, and it only
+        changes with the base map and the view limits (which also follow the
+        markers). So the figure is drawn without the title and overlays once
+        per base map and view, and those pixels are kept; later renders
+        restore them and only draw the title and overlays on top.
+        """
+        local = self._local
+        canvas = fig.canvas
+        view = (ax.get_xlim(), ax.get_ylim())
+        
+        if local.background is None or local.background_view != view:
+            # Blank the title rather than hiding it: a hidden title has an
+            # empty extent, which would make the layout move it up
+            title = ax.title.get_text()
+            ax.title.set_text("")
+            for artist in local.overlays:
+                artist.set_visible(False)
+            try:
+                canvas.draw()
+            finally:
+                for artist in local.overlays:
+                    artist.set_visible(True)
+                ax.title.set_text(title)
+            local.background = canvas.copy_from_bbox(fig.bbox)
+            local.background_view = view
+        else:
+            canvas.restore_region(local.background)
+        
+        # In zorder, as a full draw would
+        for artist in (ax.title, *local.overlays):
+            ax.draw_artist(artist)
+        
+        return np.asarray(canvas.buffer_rgba())
+    
+    def _crop_box(self, fig, ax, country: "gpd.GeoDataFrame") -> Tuple[int, int, int, int]:
+        """
+        Get the pixel rows and columns of a drawn figure that hold the map.
+        
+        Crops the empty margins around the map like savefig(bbox_inches='tight'),
+        without its measuring draw: the extent is computed from the country
+        bounds, the city markers and the few artists drawn over the map.
+        
+        Returns:
+            (top, bottom, left, right) bounds for slicing the pixel array
+        """
+        renderer = fig.canvas.get_renderer()
+        extents = [
+            ax.transData.transform(country.total_bounds.reshape(2, 2)).ravel(),
+            ax.title.get_window_extent(renderer).extents
+        ]
+        # A scatter reports no window extent, so its markers are measured
+        # from their centers widened by the marker radius
+        markers = self._local.markers
+        if markers is not None and len(markers.get_offsets()):
+            centers = ax.transData.transform(markers.get_offsets())
+            radius = np.sqrt(MAP_MARKER_SIZE) / 2 * fig.dpi / 72
+            extents.append(np.concatenate([centers.min(axis=0) - radius, centers.max(axis=0) + radius]))
+        for artist in self._local.overlays:
+            # A label's extent is its box, which is larger than its text
+            patch = getattr(artist, "get_bbox_patch", lambda: None)()
+            extents.append((patch or artist).get_window_extent(renderer).extents)
+        
+        extents = np.array(extents)
+        width, height = fig.canvas.get_width_height()
+        x0 = max(int(np.floor(extents[:, 0].min() - MAP_CROP_PAD)), 0)
+        y0 = max(int(np.floor(extents[:, 1].min() - MAP_CROP_PAD)), 0)
+        x1 = min(int(np.ceil(extents[:, 2].max() + MAP_CROP_PAD)), width)
+        y1 = min(int(np.ceil(extents[:, 3].max() + MAP_CROP_PAD)), height)
+        
+        # Display y grows upwards, pixel rows downwards
+        return height - y1, height - y0, x0, x1
+    
+    def get_country_gdf(self, country_code: str) -> "gpd.GeoDataFrame":
+        """
+        Get the country map reprojected to EPSG:4326, loading it on first use.
+        
+        The returned GeoDataFrame is shared by all renders and must not be modified.
+        
+        Raises:
+            ValueError: If country map not found
+        """
+        code = country_code.lower()
+        country = self._geo_cache.get(code)
+        if country is not None:
+            return country
+        
+        map_path = self.supported_countries.get(code)
+        if not map_path:
+            raise ValueError(
+                f"Map not found for country: {country_code}. "
+                f"Available: {list(self.supported_countries.keys())}"
+            )
+        
+        self._ensure_libs()
+        
+        # Lock so concurrent first requests parse the GeoJSON only once
+        with self._geo_lock:
+            country = self._geo_cache.get(code)
+            if country is None:
+                # pyogrio reads GeoJSON much faster than the Fiona engine;
+                # only the geometry is drawn, so no attribute column is read
+                country = self._gpd.read_file(
+                    map_path, engine="pyogrio", columns=[]
+                ).to_crs("EPSG:4326")
+                country = _simplify_for_map(country)
+                self._geo_cache[code] = country
+        
+        return country
     
     @staticmethod
     def get_weather_icon(weather_code: int) -> str:
         """Get emoji icon for WMO weather code."""
-        return WEATHER_ICONS.get(weather_code, "❓")
+        if 0 <= weather_code < _MAX_WMO:
+            return WEATHER_ICONS_ARR[weather_code]
+        return "❓"
     
     def generate_map(
         self,
@@ -140,8 +650,9 @@ class WeatherMapService:
         title: Optional[str] = None,
         day_index: int = 0,
         map_type: str = "general",
-        save_to_disk: bool = True
-    ) -> Tuple[io.BytesIO, Optional[str]]:
+        save_to_disk: bool = True,
+        return_buffer: bool = True
+    ) -> Tuple[Optional[io.BytesIO], Optional[str]]:
         """
         Generate a weather map image from meteo data.
         
@@ -152,80 +663,148 @@ class WeatherMapService:
             day_index: Which day's data to display (0 = first day)
             map_type: Type of map to generate (general, maxtemp, mintemp, sun, wind)
             save_to_disk: Whether to save the map to disk
+            return_buffer: Whether to return the PNG image (False when only
+                the file on disk is needed)
         
         Returns:
-            Tuple of (BytesIO buffer containing PNG image, output file path or None)
+            Tuple of (BytesIO buffer containing PNG image or None, output file path or None)
         
         Raises:
             ValueError: If country map not found or meteo data is invalid
         """
-        # Validate inputs
-        if not meteo_data:
-            raise ValueError("No meteo data provided")
-        
-        # Load country GeoJSON
-        map_path = self.supported_countries.get(country_code.lower())
-        if not map_path:
-            raise ValueError(
-                f"Map not found for country: {country_code}. "
-                f"Available: {list(self.supported_countries.keys())}"
-            )
+        prepared = self.prepare_map(meteo_data, country_code)
+        return self.render_map(
+            prepared,
+            title=title,
+            day_index=day_index,
+            map_type=map_type,
+            save_to_disk=save_to_disk,
+            return_buffer=return_buffer
+        )
+    
+    def prepare_map(
+        self,
+        meteo_data: List[WeatherLocation],
+        country_code: str
+    ) -> PreparedMap:
+        """
+        Load the country map and order the locations for rendering.
         
-        country = gpd.read_file(map_path).to_crs("EPSG:4326")
+        The result only depends on the request data, so it can be shared by
+        several render_map() calls, including concurrent ones.
         
-        # Create figure
-        fig, ax = plt.subplots(figsize=(12, 11))
+        Args:
+            meteo_data: List of weather data for locations
+            country_code: Country code to load map for
         
-        # Plot base map
-        country.plot(
-            ax=ax,
-            color="#e8f4e8",  # Light green background
-            edgecolor="#333333",
-            linewidth=0.8
-        )
+        Returns:
+            PreparedMap to pass to render_map()
         
-        # Get the date from first location's data
-        date_str = None
-        if meteo_data and meteo_data[0].daily.time:
-            if day_index < len(meteo_data[0].daily.time):
-                date_str = meteo_data[0].daily.time[day_index]
-        
-        # Sort by priority (lower = more important = rendered last = on top)
-        sorted_data = sorted(meteo_data, key=lambda x: x.priority or 99, reverse=True)
-        
-        # Plot weather data for each location
-        for item in sorted_data:
-            self._plot_location(ax, item, day_index, map_type)
-        
-        # Set title
-        title_prefix = self._get_title_prefix(map_type)
-        if title:
-            map_title = title
-        elif date_str:
-            map_title = f"{title_prefix} — {date_str}"
-        else:
-            map_title = f"{title_prefix} — {datetime.now().strftime('%Y-%m-%d')}"
+        Raises:
+            ValueError: If country map not found or meteo data is invalid
+        """
+        # Validate inputs
+        if not meteo_data:
+            raise ValueError("No meteo data provided")
         
-        ax.set_title(map_title, fontsize=18, fontweight='bold', pad=20)
-        ax.axis("off")
+        # Load country GeoJSON (parsed once, then served from the cache)
+        country = self.get_country_gdf(country_code)
         
-        # Remove borders
-        for spine in ax.spines.values():
-            spine.set_visible(False)
+        # Sort by priority (lower = more important = rendered last = on top);
+        # a stable sort on the negated key keeps the input order of ties
+        priority = np.fromiter(
+            (loc.priority or 99 for loc in meteo_data), dtype=np.int64, count=len(meteo_data)
+        )
+        order = np.argsort(-priority, kind="stable")
         
-        # Save to disk if requested
-        output_path = None
-        if save_to_disk:
-            output_path = self._save_to_disk(country_code, map_type, fig)
+        return PreparedMap(
+            country_code=country_code,
+            country=country,
+            batch=WeatherBatch.from_locations(meteo_data).take(order),
+            dates=tuple(meteo_data[0].daily.time or ())
+        )
+    
+    def render_map(
+        self,
+        prepared: PreparedMap,
+        title: Optional[str] = None,
+        day_index: int = 0,
+        map_type: str = "general",
+        save_to_disk: bool = True,
+        return_buffer: bool = True
+    ) -> Tuple[Optional[io.BytesIO], Optional[str]]:
+        """
+        Render one map type from data returned by prepare_map().
         
-        # Save to buffer
-        buffer = io.BytesIO()
-        plt.savefig(buffer, format='png', dpi=200, bbox_inches='tight',
-                    facecolor='white', edgecolor='none')
-        buffer.seek(0)
-        plt.close(fig)
+        Args:
+            prepared: Country map and locations from prepare_map()
+            title: Optional title for the map
+            day_index: Which day's data to display (0 = first day)
+            map_type: Type of map to generate (general, maxtemp, mintemp, sun, wind)
+            save_to_disk: Whether to save the map to disk
+            return_buffer: Whether to return the PNG image (False when only
+                the file on disk is needed)
         
-        return buffer, output_path
+        Returns:
+            Tuple of (BytesIO buffer containing PNG image or None, output file path or None)
+        """
+        fig, ax = self._get_figure(prepared)
+        try:
+            now = datetime.now()  # One clock read for the title and the file name
+            
+            # Get the date from first location's data
+            date_str = None
+            if day_index < len(prepared.dates):
+                date_str = prepared.dates[day_index]
+            
+            # Plot weather data for all locations (removed again by the next
+            # render on this thread)
+            day_frame = _build_day_frame(prepared.batch, day_index)
+            self._local.overlays = self._plot_locations(ax, prepared.batch, day_frame, map_type)
+            
+            # Set title
+            title_prefix = self._get_title_prefix(map_type)
+            if title:
+                map_title = title
+            elif date_str:
+                map_title = f"{title_prefix} — {date_str}"
+            else:
+                map_title = f"{title_prefix} — {now.strftime('%Y-%m-%d')}"
+            
+            ax.set_title(map_title, fontsize=18, fontweight='bold', pad=20)
+            
+            # Nothing to encode if the image is neither returned nor saved
+            if not (return_buffer or save_to_disk):
+                return None, None
+            
+            # Rasterize and encode once; the same PNG bytes are returned and saved.
+            # A returned buffer belongs to the caller, but one only written to
+            # disk is reused by the next render on this thread
+            if return_buffer:
+                buffer = io.BytesIO()
+            else:
+                buffer = self._local.png_buffer
+                buffer.seek(0)
+                buffer.truncate()
+            pixels = self._rasterize(fig, ax)
+            top, bottom, left, right = self._crop_box(fig, ax, prepared.country)
+            self._Image.fromarray(pixels[top:bottom, left:right]).save(
+                buffer, format="PNG", **PNG_SAVE_OPTIONS
+            )
+            buffer.seek(0)
+            
+            # Save to disk if requested
+            output_path = None
+            if save_to_disk:
+                with buffer.getbuffer() as png_data:
+                    output_path = self._save_to_disk(prepared.country_code, map_type, png_data, now)
+            
+            return (buffer if return_buffer else None), output_path
+        except BaseException:
+            # The figure may be left half-updated (markers, hidden labels,
+            # title); start the next render on this thread from a cleared axes
+            self._local.base = None
+            raise
     
     def generate_all_maps(
         self,
@@ -244,141 +823,203 @@ class WeatherMapService:
         Returns:
             Dictionary mapping map_type to output file path
         """
-        map_types = ["maxtemp", "mintemp", "wind", "sun"]
+        prepared = self.prepare_map(meteo_data, country_code)
         generated_files = {}
         
-        for map_type in map_types:
-            _, output_path = self.generate_map(
-                meteo_data=meteo_data,
-                country_code=country_code,
+        if self.render_processes:
+            # One map type per worker process, rendered in parallel
+            futures = {
+                map_type: self.submit_render(prepared, map_type, day_index=day_index)
+                for map_type in MAP_TYPES
+            }
+            for map_type, future in futures.items():
+                output_path = future.result()
+                if output_path:
+                    generated_files[map_type] = output_path
+            return generated_files
+        
+        for map_type in MAP_TYPES:
+            _, output_path = self.render_map(
+                prepared,
                 day_index=day_index,
                 map_type=map_type,
-                save_to_disk=True
+                save_to_disk=True,
+                return_buffer=False
             )
             if output_path:
                 generated_files[map_type] = output_path
         
         return generated_files
     
-    def _plot_location(
+    def submit_render(
+        self,
+        prepared: PreparedMap,
+        map_type: str,
+        day_index: int = 0
+    ) -> "Future[Optional[str]]":
+        """
+        Render one map type to disk in a worker process.
+        
+        Agg drawing and PNG encoding hold the GIL for most of a render, so
+        threads barely overlap; processes do. Workers are started once and
+        kept: each one has its own service, with its own country map cache,
+        figure and cached base map, so only the country code and the location
+        batch are sent per render.
+        
+        Args:
+            prepared: Country map and locations from prepare_map()
+            map_type: Type of map to generate
+            day_index: Which day's data to display
+        
+        Returns:
+            Future of the output file path
+        """
+        args = (prepared.country_code, prepared.batch, prepared.dates, day_index, map_type)
+        pool = self._get_pool()
+        try:
+            return pool.submit(_render_in_worker, *args)
+        except BrokenProcessPool:
+            # A worker died (e.g. killed for memory); replace the whole pool
+            with self._pool_lock:
+                if self._pool is pool:
+                    self._pool = None
+            return self._get_pool().submit(_render_in_worker, *args)
+    
+    def _get_pool(self) -> ProcessPoolExecutor:
+        """Get the render worker pool, starting it on first use."""
+        with self._pool_lock:
+            if self._pool is None:
+                # Spawn rather than fork: the process forking may be running
+                # other threads (server, render threads) holding locks
+                self._pool = ProcessPoolExecutor(
+                    max_workers=self.render_processes or 1,
+                    mp_context=multiprocessing.get_context("spawn"),
+                    initializer=_init_render_worker,
+                    initargs=(self.maps_folder, self.output_folder)
+                )
+            return self._pool
+    
+    def close(self):
+        """Stop the render worker processes, if any were started."""
+        with self._pool_lock:
+            if self._pool is not None:
+                self._pool.shutdown()
+                self._pool = None
+    
+    def _plot_locations(
         self,
         ax,
-        location: WeatherLocation,
-        day_index: int,
+        batch: WeatherBatch,
+        day_frame: Dict[str, np.ndarray],
         map_type: str
-    ):
-        """Plot a single location on the map."""
-        lon = location.longitude
-        lat = location.latitude
-        name = location.display_name or location.name
-        daily = location.daily
-        
-        # Get data for the specified day index
-        idx = min(day_index, len(daily.temperature_2m_max) - 1)
-        
-        tmax = daily.temperature_2m_max[idx]
-        tmin = daily.temperature_2m_min[idx]
-        rain = daily.precipitation_sum[idx]
-        wind = daily.wind_speed_10m_max[idx]
-        weather_code = daily.weather_code[idx]
-        
-        cloud_max = None
-        if daily.cloud_cover_max and idx < len(daily.cloud_cover_max):
-            cloud_max = daily.cloud_cover_max[idx]
-        
-        # Calculate sunshine percentage
-        sunshine = 100 - cloud_max if cloud_max is not None else None
-        
-        # Get weather icon
-        icon = self.get_weather_icon(weather_code)
-        
-        # City marker color based on map type
-        marker_color = self._get_marker_color(map_type, tmax, tmin, wind, sunshine)
-        ax.plot(lon, lat, "o", color=marker_color, markersize=6, zorder=5)
-        
-        # Build label based on map type
-        label, _ = self._build_label(
-            map_type, name, tmax, tmin, rain, wind, cloud_max, sunshine, icon
-        )
+    ) -> list:
+        """Plot all locations of a batch on the map, returning the drawn artists."""
+        local = self._local
         
-        # Determine label position based on priority
-        priority = location.priority or 1
-        x_offset = 0.2 if priority <= 2 else 0.15
-        y_offset = 0.2 if priority <= 2 else 0.15
-        fontsize = 10 if priority == 1 else 9 if priority == 2 else 8
-        
-        ax.text(
-            lon + x_offset,
-            lat + y_offset,
-            label,
-            fontsize=fontsize,
-            ha="left",
-            va="top",
-            zorder=10,
-            bbox=dict(
-                boxstyle="round,pad=0.3",
-                fc="white",
-                ec="#666666",
-                alpha=0.92,
-                linewidth=1
-            )
-        )
+        # City markers, colored based on map type, drawn in a single call
+        marker_colors = self._get_marker_colors(map_type, day_frame)
+        local.markers = ax.scatter(batch.lon, batch.lat, c=marker_colors, s=MAP_MARKER_SIZE, zorder=5)
+        
+        labels = self._build_labels(map_type, batch.names, day_frame)
+        
+        # Label positions and sizes are precomputed per batch
+        label_x = batch.label_x.tolist()
+        label_y = batch.label_y.tolist()
+        label_fontsize = batch.label_fontsize.tolist()
+        
+        # Label texts (each with its box patch) left on the axes by previous
+        # renders are updated in place; only missing ones are created
+        pool = local.labels
+        for i, label in enumerate(labels):
+            if i < len(pool):
+                text = pool[i]
+                text.set_position((label_x[i], label_y[i]))
+                text.set_text(label)
+                text.set_fontsize(label_fontsize[i])
+                text.set_visible(True)
+            else:
+                pool.append(ax.text(
+                    label_x[i],
+                    label_y[i],
+                    label,
+                    fontsize=label_fontsize[i],
+                    ha="left",
+                    va="top",
+                    zorder=10,
+                    bbox=LABEL_BBOX  # Copied by matplotlib, safe to share
+                ))
+        
+        return [local.markers, *pool[:len(labels)]]
     
     @staticmethod
-    def _get_marker_color(
-        map_type: str,
-        tmax: float,
-        tmin: float,
-        wind: float,
-        sunshine: Optional[float]
-    ) -> str:
-        """Get marker color based on map type and weather data."""
-        if map_type == "maxtemp":
-            return "#ff5722" if tmax > 25 else "#ff9800" if tmax > 15 else "#2196f3"
-        elif map_type == "mintemp":
-            return "#2196f3" if tmin < 5 else "#03a9f4" if tmin < 15 else "#ff9800"
-        elif map_type == "wind":
-            return "#d32f2f" if wind > 30 else "#ff9800" if wind > 20 else "#4caf50"
-        elif map_type == "sun":
-            if sunshine is not None:
-                return "#fdd835" if sunshine > 70 else "#ffb300" if sunshine > 40 else "#90a4ae"
-            return "#90a4ae"
-        else:
-            return "#d32f2f"
+    def _get_marker_colors(map_type: str, day_frame: Dict[str, np.ndarray]) -> np.ndarray:
+        """Get the RGBA marker color of every location based on map type and weather data."""
+        rule = _MARKER_COLOR_RULES.get(map_type)
+        if rule is None:
+            return np.repeat(_DEFAULT_MARKER_RGBA, len(day_frame["tmax"]), axis=0)
+        
+        column, compare, thresholds, _ = rule
+        values = day_frame[column]
+        color_ids = np.zeros(len(values), dtype=np.uint8)
+        for threshold in thresholds:
+            color_ids += compare(values, threshold)
+        return _MARKER_COLOR_LUTS[map_type][color_ids]
     
     @staticmethod
-    def _build_label(
+    def _build_labels(
         map_type: str,
-        name: str,
-        tmax: float,
-        tmin: float,
-        rain: float,
-        wind: float,
-        cloud_max: Optional[int],
-        sunshine: Optional[float],
-        icon: str
-    ) -> Tuple[str, str]:
-        """Build label text and title prefix based on map type."""
+        names: Tuple[str, ...],
+        day_frame: Dict[str, np.ndarray]
+    ) -> List[str]:
+        """
+        Build the label text of every location based on map type.
+        
+        Conditions are evaluated as masks over the day's columns, and values
+        are formatted once per column (see _format_values).
+        """
         if map_type == "maxtemp":
-            return f"{name}\n🌡 {tmax}°C", "Maximum Temperature"
+            return [f"{name}\n🌡 {tmax}°C" for name, tmax in zip(names, _format_values(day_frame["tmax"]))]
         elif map_type == "mintemp":
-            return f"{name}\n🌡 {tmin}°C", "Minimum Temperature"
+            return [f"{name}\n🌡 {tmin}°C" for name, tmin in zip(names, _format_values(day_frame["tmin"]))]
         elif map_type == "wind":
-            return f"{name}\n💨 {wind} km/h", "Wind Speed"
-        elif map_type == "sun":
-            sun_emoji = "☀️" if sunshine and sunshine > 70 else "⛅" if sunshine and sunshine > 40 else "☁️"
-            label = f"{name}\n{sun_emoji} {sunshine}%" if sunshine is not None else f"{name}\n❓"
-            return label, "Sunshine"
-        else:
-            # General map with all data
-            label_parts = [name, f"{icon} {tmax}° / {tmin}°"]
-            if rain > 0:
-                label_parts.append(f"🌧 {rain} mm")
-            if wind > 15:
-                label_parts.append(f"💨 {wind} km/h")
-            if cloud_max is not None and cloud_max > 50:
-                label_parts.append(f"☁ {cloud_max}%")
-            return "\n".join(label_parts), "Weather Forecast"
+            return [f"{name}\n💨 {wind} km/h" for name, wind in zip(names, _format_values(day_frame["wind"]))]
+        
+        # Cloud cover is shown as a whole percentage, NaN where missing
+        cloud = day_frame["cloud"]
+        cloud_pct = np.trunc(cloud)
+        
+        if map_type == "sun":
+            sunshine = 100 - cloud_pct
+            sun_emoji = np.select([sunshine > 70, sunshine > 40], ["☀️", "⛅"], default="☁️")
+            return [
+                f"{name}\n{emoji} {int(value)}%" if value == value else f"{name}\n❓"
+                for name, emoji, value in zip(names, sun_emoji.tolist(), sunshine.tolist())
+            ]
+        
+        # General map with all data, extra lines only where their condition holds
+        tmax = _format_values(day_frame["tmax"])
+        tmin = _format_values(day_frame["tmin"])
+        rain = _format_values(day_frame["rain"])
+        wind = _format_values(day_frame["wind"])
+        labels = [
+            f"{name}\n{icon} {hi}° / {lo}°"
+            for name, icon, hi, lo in zip(names, day_frame["icon"].tolist(), tmax, tmin)
+        ]
+        
+        rain_mask = day_frame["rain"] > 0
+        wind_mask = day_frame["wind"] > 15
+        cloud_mask = cloud_pct > 50
+        for i in np.flatnonzero(rain_mask | wind_mask | cloud_mask).tolist():
+            label_parts = [labels[i]]
+            if rain_mask[i]:
+                label_parts.append(f"🌧 {rain[i]} mm")
+            if wind_mask[i]:
+                label_parts.append(f"💨 {wind[i]} km/h")
+            if cloud_mask[i]:
+                label_parts.append(f"☁ {int(cloud_pct[i])}%")
+            labels[i] = "\n".join(label_parts)
+        
+        return labels
     
     @staticmethod
     def _get_title_prefix(map_type: str) -> str:
@@ -396,32 +1037,73 @@ class WeatherMapService:
         self,
         country_code: str,
         map_type: str,
-        fig
+        png_data: memoryview,
+        now: datetime
     ) -> str:
-        """Save the figure to disk and return the file path."""
+        """Write encoded PNG data to disk and return the file path."""
         # Create output directory structure
-        today_date = datetime.now().strftime('%Y-%m-%d')
+        today_date = now.strftime('%Y-%m-%d')
         output_dir = self.output_folder / country_code.lower() / today_date
         output_dir.mkdir(parents=True, exist_ok=True)
         
         # Generate filename based on map type
-        if map_type in ["maxtemp", "mintemp", "wind", "sun"]:
+        if map_type in MAP_TYPES:
             filename = f"{map_type}.png"
         else:
-            timestamp = datetime.now().strftime('%H%M%S')
+            timestamp = now.strftime('%H%M%S')
             filename = f"weather_map_{timestamp}.png"
         
         output_path = output_dir / filename
         
-        # Save to file
-        plt.savefig(output_path, format='png', dpi=200, bbox_inches='tight',
-                    facecolor='white', edgecolor='none')
+        # Save to a temporary file and rename it into place, so readers never
+        # see a partial image and the folder mtime changes on overwrites too
+        tmp_path = output_dir / f".{filename}.{uuid.uuid4().hex}.tmp"
+        tmp_path.write_bytes(png_data)
+        os.replace(tmp_path, output_path)
         
         print(f"📁 Saved map to: {output_path}")
         
         return str(output_path)
 
 
+# ===============================
+# RENDER WORKER PROCESSES
+# ===============================
+
+# Service of a render worker process (see WeatherMapService.submit_render)
+_worker_service: Optional[WeatherMapService] = None
+
+
+def _init_render_worker(maps_folder: Path, output_folder: Path):
+    """Create the service used by every render of this worker process."""
+    global _worker_service
+    _worker_service = WeatherMapService(maps_folder, output_folder)
+
+
+def _render_in_worker(
+    country_code: str,
+    batch: WeatherBatch,
+    dates: Tuple[str, ...],
+    day_index: int,
+    map_type: str
+) -> Optional[str]:
+    """Render one map to disk with the worker's service, returning its path."""
+    prepared = PreparedMap(
+        country_code=country_code,
+        country=_worker_service.get_country_gdf(country_code),
+        batch=batch,
+        dates=dates
+    )
+    _, output_path = _worker_service.render_map(
+        prepared,
+        day_index=day_index,
+        map_type=map_type,
+        save_to_disk=True,
+        return_buffer=False
+    )
+    return output_path
+
+
 # ===============================
 # HELPER FUNCTIONS
 # ===============================
@@ -455,3 +1137,72 @@ def create_weather_location_from_dict(data: dict) -> WeatherLocation:
         daily=daily_data,
         priority=data.get("priority", 1)
     )
+
+
+# Required daily keys, in DailyData field order, read with one call per location
+_get_daily_required = itemgetter(
+    "time",
+    "weather_code",
+    "temperature_2m_max",
+    "temperature_2m_min",
+    "precipitation_sum",
+    "wind_speed_10m_max"
+)
+
+
+def create_weather_locations_batch(payload: List[dict]) -> List[WeatherLocation]:
+    """
+    Create WeatherLocation instances from a list of dictionaries.
+    
+    Gives the same result as create_weather_location_from_dict() on each
+    item, with the key lookups of the daily data done by a single itemgetter
+    call per location instead of one subscript per field.
+    
+    Args:
+        payload: List of dictionaries containing weather location data
+    
+    Returns:
+        List of WeatherLocation instances, in payload order
+    """
+    dailies = list(map(itemgetter("daily"), payload))
+    return [
+        WeatherLocation(
+            latitude=data["latitude"],
+            longitude=data["longitude"],
+            name=data["name"],
+            display_name=data.get("display_name", data["name"]),
+            daily=DailyData(
+                *_get_daily_required(daily),
+                cloud_cover_min=daily.get("cloud_cover_min"),
+                cloud_cover_max=daily.get("cloud_cover_max")
+            ),
+            priority=data.get("priority", 1)
+        )
+        for data, daily in zip(payload, dailies)
+    ]
+
+
+def create_weather_location_from_model(location: "MeteoLocation") -> WeatherLocation:
+    """
+    Create a WeatherLocation instance from an already validated MeteoLocation.
+    
+    Reads the model attributes directly instead of converting the model
+    to a dict for create_weather_location_from_dict().
+    
+    Args:
+        location: MeteoLocation request model
+    
+    Returns:
+        WeatherLocation instance
+    """
+    daily = location.daily
+    daily_data = DailyData(**{f.name: getattr(daily, f.name) for f in _DAILY_FIELDS})
+    
+    return WeatherLocation(
+        latitude=location.latitude,
+        longitude=location.longitude,
+        name=location.name,
+        display_name=location.display_name,
+        daily=daily_data,
+        priority=location.priority
+    )